@@ -8,7 +8,10 @@ from io import BytesIO, StringIO
 import tempfile
 import os
 from datetime import datetime, time
-from attendance_calculator import AttendanceProcessor
+from typing import List, Optional, Tuple
+from attendance_calculator import (
+    AttendanceProcessor, detect_csv_encoding, read_csv_bytes, standardize_columns, write_excel
+)
 
 
 # 頁面配置
@@ -56,6 +59,109 @@ def init_session_state():
         st.session_state.break_max_interval = 120
 
 
+def read_csv_frame(file_bytes: bytes) -> Optional[pd.DataFrame]:
+    """
+    解析單一上傳檔案並標準化欄位名稱，無法判斷編碼時回傳 None
+    
+    UTF-8 以 pyarrow 解析，其他編碼或欄位數不一致時改用 pandas C 引擎
+    """
+    encoding = detect_csv_encoding(file_bytes)
+    if encoding is None:
+        return None
+    
+    return standardize_columns(read_csv_bytes(file_bytes, encoding))
+
+
+@st.cache_data(show_spinner=False)
+def run_pipeline(
+    file_bytes_list: Tuple[bytes, ...],
+    start_times: Tuple[Tuple[str, int, int], ...],
+    default_hour: int,
+    default_minute: int
+) -> Tuple[Optional[pd.DataFrame], List[int]]:
+    """
+    解析上傳檔案並計算出勤，結果依輸入內容快取
+    
+    Args:
+        file_bytes_list: 各上傳檔案的原始位元組
+        start_times: 員工特殊起算時間 (考勤號碼, 小時, 分鐘)
+        default_hour: 預設起算小時
+        default_minute: 預設起算分鐘
+    
+    Returns:
+        (處理結果，沒有可讀取的檔案時為 None；無法讀取的檔案索引)
+    """
+    # 逐檔解析後合併，不經過整份文字字串
+    # 各檔先改為標準欄位名稱再合併，欄位拼法不同的檔案才不會錯位
+    frames = []
+    unreadable = []
+    for idx, file_bytes in enumerate(file_bytes_list):
+        frame = read_csv_frame(file_bytes)
+        if frame is None:
+            unreadable.append(idx)
+            continue
+        frames.append(frame)
+    
+    if not frames:
+        return None, unreadable
+    
+    combined_df = pd.concat(frames, ignore_index=True)
+    
+    # 建立處理器
+    processor = AttendanceProcessor(
+        employee_start_times={
+            emp_id: (hour, minute)
+            for emp_id, hour, minute in start_times
+        }
+    )
+    
+    # 設定預設起算時間
+    processor.employee_start_times.setdefault(None, (default_hour, default_minute))
+    
+    return processor.process_csv(combined_df), unreadable
+
+
+@st.cache_data(show_spinner=False)
+def build_excel(df: pd.DataFrame) -> bytes:
+    """產生出勤記錄 Excel 檔案內容，依 DataFrame 內容快取"""
+    output = BytesIO()
+    write_excel(df, output, highlight_late=True)
+    
+    return output.getvalue()
+
+
+@st.cache_data(show_spinner=False)
+def summarize_results(
+    df: pd.DataFrame,
+    selected_emp: Tuple,
+    selected_date: Tuple
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    篩選結果並計算統計摘要，依資料與篩選條件快取
+    
+    Returns:
+        (篩選後資料, 按員工統計, 按日期統計)
+    """
+    filtered_df = df[
+        (df["考勤號碼"].isin(selected_emp)) &
+        (df["日期"].isin(selected_date))
+    ]
+    
+    emp_stats = filtered_df.groupby("姓名", observed=True).agg({
+        "實際工時": "sum",
+        "加班時數": "sum",
+        "日期": "count"
+    }).rename(columns={"日期": "工作日數"})
+    
+    date_stats = filtered_df.groupby("日期", observed=True).agg({
+        "實際工時": "sum",
+        "加班時數": "sum",
+        "考勤號碼": "count"
+    }).rename(columns={"考勤號碼": "人數"})
+    
+    return filtered_df, emp_stats, date_stats
+
+
 def main():
     init_session_state()
     
@@ -186,63 +292,38 @@ def main():
         if uploaded_files and process_button:
             try:
                 with st.spinner("正在處理檔案..."):
-                    # 合併所有 CSV
-                    all_data = []
-                    for uploaded_file in uploaded_files:
-                        # 嘗試多種編碼
-                        content = None
-                        encodings = ['utf-8', 'big5', 'gb2312', 'latin-1', 'cp1252']
-                        file_bytes = uploaded_file.read()
-                        
-                        for encoding in encodings:
-                            try:
-                                content = file_bytes.decode(encoding)
-                                break
-                            except (UnicodeDecodeError, LookupError):
-                                continue
-                        
-                        if content is None:
-                            st.error(f"❌ 無法讀取 {uploaded_file.name}，編碼不支援")
-                            continue
-                        
-                        all_data.append(content)
-                    
-                    if not all_data:
-                        st.error("❌ 沒有可處理的檔案")
-                    else:
-                        combined_csv = "\n".join(all_data)
-                    
-                    # 建立處理器
-                    processor = AttendanceProcessor(
-                        employee_start_times={
-                            emp_id: (times["hour"], times["minute"])
+                    # 依檔案內容與起算時間快取，輸入未變時不重新計算
+                    result_df, unreadable = run_pipeline(
+                        tuple(uploaded_file.getvalue() for uploaded_file in uploaded_files),
+                        tuple(sorted(
+                            (emp_id, times["hour"], times["minute"])
                             for emp_id, times in st.session_state.employee_times.items()
-                        }
-                    )
-                    
-                    # 設定預設起算時間
-                    processor.employee_start_times.setdefault(
-                        None,
-                        (st.session_state.default_hour, st.session_state.default_minute)
+                        )),
+                        st.session_state.default_hour,
+                        st.session_state.default_minute
                     )
                     
-                    # 處理資料
-                    result_df = processor.process_csv(combined_csv)
-                    st.session_state.processed_data = result_df
+                    for idx in unreadable:
+                        st.error(f"❌ 無法讀取 {uploaded_files[idx].name}，編碼不支援")
                     
-                    st.success(f"✅ 成功處理 {len(uploaded_files)} 個檔案，共 {len(result_df)} 筆記錄")
-                    
-                    # 顯示統計資訊
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("總記錄數", len(result_df))
-                    with col2:
-                        st.metric("員工數", result_df["考勤號碼"].nunique())
-                    with col3:
-                        st.metric("工作日數", result_df["日期"].nunique())
-                    with col4:
-                        total_hours = result_df["實際工時"].sum()
-                        st.metric("總工時", f"{total_hours:.1f} 小時")
+                    if result_df is None:
+                        st.error("❌ 沒有可處理的檔案")
+                    else:
+                        st.session_state.processed_data = result_df
+                        
+                        st.success(f"✅ 成功處理 {len(uploaded_files)} 個檔案，共 {len(result_df)} 筆記錄")
+                        
+                        # 顯示統計資訊
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("總記錄數", len(result_df))
+                        with col2:
+                            st.metric("員工數", result_df["考勤號碼"].nunique())
+                        with col3:
+                            st.metric("工作日數", result_df["日期"].nunique())
+                        with col4:
+                            total_hours = result_df["實際工時"].sum()
+                            st.metric("總工時", f"{total_hours:.1f} 小時")
                     
             except Exception as e:
                 st.error(f"❌ 處理失敗：{str(e)}")
@@ -289,11 +370,10 @@ def main():
             with col3:
                 show_all = st.checkbox("顯示所有欄位", value=True)
             
-            # 篩選資料
-            filtered_df = df[
-                (df["考勤號碼"].isin(selected_emp)) &
-                (df["日期"].isin(selected_date))
-            ]
+            # 篩選資料與統計（依資料與篩選條件快取）
+            filtered_df, emp_stats, date_stats = summarize_results(
+                df, tuple(selected_emp), tuple(selected_date)
+            )
             
             if show_all:
                 st.dataframe(filtered_df, use_container_width=True)
@@ -310,20 +390,10 @@ def main():
             
             with col1:
                 st.write("**按員工統計**")
-                emp_stats = filtered_df.groupby("姓名").agg({
-                    "實際工時": "sum",
-                    "加班時數": "sum",
-                    "日期": "count"
-                }).rename(columns={"日期": "工作日數"})
                 st.dataframe(emp_stats, use_container_width=True)
             
             with col2:
                 st.write("**按日期統計**")
-                date_stats = filtered_df.groupby("日期").agg({
-                    "實際工時": "sum",
-                    "加班時數": "sum",
-                    "考勤號碼": "count"
-                }).rename(columns={"考勤號碼": "人數"})
                 st.dataframe(date_stats, use_container_width=True)
         
         else:
@@ -372,55 +442,10 @@ def main():
             col1, col2 = st.columns(2)
             
             with col1:
-                # Excel 匯出
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                    df.to_excel(writer, sheet_name="出勤記錄", index=False)
-                    
-                    # 調整欄寬並標記遲到
-                    from openpyxl.styles import PatternFill
-                    worksheet = writer.sheets["出勤記錄"]
-                    red_fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-                    
-                    # 找到上班時間欄位索引
-                    checkin_col_idx = None
-                    for idx, cell in enumerate(worksheet[1], 1):
-                        if cell.value == "上班時間":
-                            checkin_col_idx = idx
-                            break
-                    
-                    # 標記遲到（上班時間 > 起算時間）
-                    for row_idx, row in enumerate(worksheet.iter_rows(min_row=2), 2):
-                        if checkin_col_idx and row[checkin_col_idx - 1].value:
-                            try:
-                                checkin_time_str = str(row[checkin_col_idx - 1].value)
-                                checkin_hour = int(checkin_time_str.split(":")[0])
-                                # 預設起算時間 08:00，如果上班時間 > 08:00 則標紅
-                                if checkin_hour > 8:
-                                    for cell in row:
-                                        if cell.value is not None:
-                                            cell.fill = red_fill
-                            except:
-                                pass
-                    
-                    # 調整欄寬
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        worksheet.column_dimensions[column_letter].width = adjusted_width
-                
-                output.seek(0)
-                
+                # Excel 匯出（依資料內容快取，未變動時不重新產生）
                 st.download_button(
                     label="📥 下載 Excel 檔案",
-                    data=output.getvalue(),
+                    data=build_excel(df),
                     file_name=f"出勤記錄_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     use_container_width=True
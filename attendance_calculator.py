@@ -3,39 +3,402 @@
 負責處理打卡資料的解析、工時計算、休息推估等邏輯
 """
 
-from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Optional
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from io import BytesIO
+from typing import List, Dict, Tuple, Optional, Union
+import codecs
+import csv
+import charset_normalizer
+import numpy as np
 import pandas as pd
 import re
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    _HAS_PYARROW = True
+except ImportError:
+    _HAS_PYARROW = False
+
+try:
+    import xlsxwriter
+    from xlsxwriter.utility import xl_col_to_name
+    _HAS_XLSXWRITER = True
+except ImportError:
+    _HAS_XLSXWRITER = False
+
+
+# 打卡機在日期與時間之間插入的機器代碼（例如 "A12P12"）
+_MACHINE_CODE_RE = re.compile(r'\s+[A-Z0-9]+\s+')
+
+# 支援的打卡日期時間格式（依序嘗試）
+_DATETIME_FORMATS = (
+    "%Y/%m/%d %H:%M",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%m/%d %H:%M",
+    "%m-%d %H:%M",
+)
+
+# 整欄解析時只使用含年份的格式
+_DATED_DATETIME_FORMATS = tuple(fmt for fmt in _DATETIME_FORMATS if fmt.startswith("%Y"))
+
+# 依字串形態直接選定唯一格式：(日期分隔符號, 是否含秒) -> 格式
+_DATETIME_RE = re.compile(
+    r'^\d{4}(?P<sep>[-/])\d{1,2}(?P=sep)\d{1,2}\s+\d{1,2}:\d{2}(?P<seconds>:\d{2})?$'
+)
+_DATETIME_FORMAT_BY_SHAPE = {
+    ("/", False): "%Y/%m/%d %H:%M",
+    ("-", False): "%Y-%m-%d %H:%M",
+    ("/", True): "%Y/%m/%d %H:%M:%S",
+    ("-", True): "%Y-%m-%d %H:%M:%S",
+}
+
+# 輸出欄位順序
+RESULT_COLUMNS = (
+    "日期", "姓名", "考勤號碼", "上班時間", "下班時間",
+    "休息開始", "休息結束", "休息分鐘數", "實際工時", "加班時數", "備註",
+)
+
+# 常見欄位名稱 -> 標準欄位名稱
+_COLUMN_ALIASES = {
+    "姓名": "姓名",
+    "名字": "姓名",
+    "name": "姓名",
+    "考勤號碼": "考勤號碼",
+    "工號": "考勤號碼",
+    "員工編號": "考勤號碼",
+    "id": "考勤號碼",
+    "日期時間": "日期時間",
+    "打卡時間": "日期時間",
+    "datetime": "日期時間",
+    "簽到/退": "簽到/退",
+    "簽到/簽退": "簽到/退",
+    "check": "簽到/退",
+    "status": "簽到/退",
+    "狀態": "簽到/退",
+}
+
+# 必要欄位：(標準名稱, 模糊比對關鍵字, 缺少時的錯誤訊息)
+_REQUIRED_COLUMNS = (
+    ("姓名", ["姓名", "名字", "name"], "缺少姓名欄位"),
+    ("考勤號碼", ["考勤", "號碼", "id", "員工", "工號"], "缺少考勤號碼欄位"),
+    ("日期時間", ["日期時間", "時間", "datetime", "date"], "缺少日期時間欄位"),
+    ("簽到/退", ["簽", "check", "status"], "缺少簽到/退欄位"),
+)
+
+# 休息推估：前一筆打卡需落在此時段內
+_BREAK_WINDOW_START = time(10, 30)
+_BREAK_WINDOW_END = time(14, 30)
+
+
+def detect_csv_encoding(raw: bytes) -> Optional[str]:
+    """
+    判斷 CSV 位元組的文字編碼
+    
+    先以 UTF-8 嚴格驗證，失敗時才以 charset_normalizer 偵測編碼
+    
+    Args:
+        raw: 檔案原始位元組
+    
+    Returns:
+        編碼名稱（含 BOM 的 UTF-8 為 "utf-8-sig"）；無法判斷時為 None
+    """
+    if raw.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    
+    try:
+        raw.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    
+    best = charset_normalizer.from_bytes(raw).best()
+    if best is None:
+        return None
+    return best.encoding
+
+
+def read_csv_bytes(raw: bytes, encoding: str) -> pd.DataFrame:
+    """
+    以指定編碼解析 CSV 位元組
+    
+    UTF-8 檔案在有安裝 pyarrow 時改用 pyarrow 解析（多執行緒），
+    其餘編碼或 pyarrow 解析失敗（例如欄位數不一致）時使用 pandas 的 C 引擎
+    """
+    if _HAS_PYARROW and encoding in ("utf-8", "utf-8-sig"):
+        try:
+            return _read_csv_pyarrow(raw)
+        except Exception:
+            pass
+    return pd.read_csv(BytesIO(raw), encoding=encoding)
+
+
+def _read_csv_pyarrow(raw: bytes) -> pd.DataFrame:
+    """
+    以 pyarrow 解析 UTF-8 CSV 位元組
+    
+    日期時間欄位固定讀成文字：pyarrow 會自動將 ISO 形態（例如只有日期的 2024-01-15）
+    轉為 timestamp，必須留給 _parse_datetime_column 以固定格式判斷
+    """
+    header = raw.split(b"\n", 1)[0].decode("utf-8-sig").rstrip("\r")
+    columns = next(csv.reader([header]))
+    mapping = dict(_resolve_column_mapping(tuple(col.strip() for col in columns)))
+    column_types = {col: pa.string() for col in columns if mapping.get(col.strip()) == "日期時間"}
+    
+    # 空字串視為缺值，與 pandas C 引擎一致
+    convert_options = pv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    return pv.read_csv(BytesIO(raw), convert_options=convert_options).to_pandas()
+
+
+def excel_column_widths(df: pd.DataFrame, max_width: int = 50) -> List[int]:
+    """
+    依 DataFrame 內容計算 Excel 欄寬
+    
+    直接以欄位的字串長度計算，不需逐格讀取工作表
+    
+    Args:
+        df: 要匯出的 DataFrame
+        max_width: 欄寬上限
+    
+    Returns:
+        各欄欄寬（含標題長度與 2 字元留白）
+    """
+    widths = []
+    for col in df.columns:
+        content_length = int(df[col].astype(str).str.len().max()) if len(df) else 0
+        widths.append(min(max(len(str(col)), content_length) + 2, max_width))
+    return widths
+
+
+def write_excel(df: pd.DataFrame, output, sheet_name: str = "出勤記錄", highlight_late: bool = False):
+    """
+    將結果 DataFrame 寫成 Excel
+    
+    優先以 xlsxwriter 的 constant_memory 模式逐列寫出，記憶體用量不隨列數增加；
+    未安裝 xlsxwriter 時改用 openpyxl
+    
+    Args:
+        df: 結果 DataFrame
+        output: 輸出檔案路徑或可寫入的二進位檔案物件
+        sheet_name: 工作表名稱
+        highlight_late: 是否以紅底標記上班時間晚於 08:00 的列
+    """
+    widths = excel_column_widths(df)
+    late_col = df.columns.get_loc("上班時間") if highlight_late and "上班時間" in df.columns and len(df) > 0 else None
+    
+    if not _HAS_XLSXWRITER:
+        from openpyxl.formatting.rule import FormulaRule
+        from openpyxl.styles import PatternFill
+        from openpyxl.utils import get_column_letter
+        
+        with pd.ExcelWriter(output, engine="openpyxl") as writer:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            worksheet = writer.sheets[sheet_name]
+            for idx, width in enumerate(widths):
+                worksheet.column_dimensions[get_column_letter(idx + 1)].width = width
+            if late_col is not None:
+                checkin_cell = f"${get_column_letter(late_col + 1)}2"
+                worksheet.conditional_formatting.add(
+                    f"A2:{get_column_letter(len(df.columns))}{len(df) + 1}",
+                    FormulaRule(
+                        formula=[f'IFERROR(VALUE(LEFT({checkin_cell},FIND(":",{checkin_cell})-1))>8,FALSE)'],
+                        fill=PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid"),
+                    ),
+                )
+        return
+    
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    worksheet = workbook.add_worksheet(sheet_name)
+    
+    # constant_memory 模式必須依列順序寫入，欄寬需在寫入資料前設定
+    for idx, width in enumerate(widths):
+        worksheet.set_column(idx, idx, width)
+    
+    # 標記遲到（上班時間 > 08:00）：以條件式格式套用到整列，不逐格處理
+    if late_col is not None:
+        red_fill = workbook.add_format({"bg_color": "#FF0000"})
+        checkin_cell = f"${xl_col_to_name(late_col)}2"
+        worksheet.conditional_format(1, 0, len(df), len(df.columns) - 1, {
+            "type": "formula",
+            "criteria": f'=IFERROR(VALUE(LEFT({checkin_cell},FIND(":",{checkin_cell})-1))>8,FALSE)',
+            "format": red_fill,
+        })
+    
+    # 標題列沿用 pandas to_excel 的預設樣式
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+    for row_idx, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        # 缺值（NaN、None、pd.NA）與 pandas to_excel 相同寫成空白儲存格
+        worksheet.write_row(row_idx, 0, [None if pd.isna(value) else value for value in row])
+    
+    workbook.close()
+
+
+def _fast_parse_datetime(datetime_str: str) -> Optional[datetime]:
+    """
+    快速解析固定寬度的 "YYYY/MM/DD HH:MM"（或以 - 分隔）字串
+    
+    直接切片轉整數，不經過 strptime；形態不符或日期無效時回傳 None
+    """
+    s = datetime_str
+    if len(s) != 16 or s[4] not in "/-" or s[7] != s[4] or s[10] != " " or s[13] != ":":
+        return None
+    if not (s[0:4] + s[5:7] + s[8:10] + s[11:13] + s[14:16]).isdigit():
+        return None
+    try:
+        return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]))
+    except ValueError:
+        return None
+
+
+def _find_column(columns: Tuple[str, ...], keywords: List[str]) -> Optional[str]:
+    """根據關鍵字尋找欄位"""
+    for col in columns:
+        for keyword in keywords:
+            if keyword in col:
+                return col
+    return None
+
+
+@lru_cache(maxsize=32)
+def _resolve_column_mapping(columns: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+    """
+    建立 原始欄位 -> 標準欄位 的映射
+    
+    先以別名表直接對應，找不到的欄位才以關鍵字模糊比對；
+    同一台打卡機匯出的檔案欄位相同，以欄位 tuple 快取結果
+    """
+    column_mapping = {}
+    for col in columns:
+        canonical = _COLUMN_ALIASES.get(col)
+        if canonical and canonical not in column_mapping.values():
+            column_mapping[col] = canonical
+    
+    for canonical, keywords, error_message in _REQUIRED_COLUMNS:
+        if canonical in column_mapping.values():
+            continue
+        col = _find_column(columns, keywords)
+        if not col:
+            raise ValueError(error_message)
+        column_mapping[col] = canonical
+    
+    return tuple(column_mapping.items())
+
+
+def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    將欄位名稱去除空白並改為標準名稱（姓名、考勤號碼、日期時間、簽到/退）
+    
+    多個檔案合併前應逐檔呼叫，避免欄位拼法不同的檔案在合併時錯位
+    
+    Raises:
+        ValueError: 缺少必要欄位
+    """
+    df = df.set_axis(df.columns.str.strip(), axis=1)
+    
+    # 應用欄位映射（同樣的欄位組合只比對一次）
+    column_mapping = dict(_resolve_column_mapping(tuple(df.columns)))
+    return df.rename(columns=column_mapping)
+
+
+def _sniff_datetime_format(values, sample_size: int = 5) -> Optional[str]:
+    """
+    由前幾筆非空值判斷整份檔案共用的日期時間格式
+    
+    取樣中出現最多的形態勝出；皆無法判斷時回傳 None，由呼叫端逐一嘗試格式
+    """
+    counts: Dict[str, int] = {}
+    sampled = 0
+    for value in values:
+        if sampled >= sample_size:
+            break
+        if not isinstance(value, str) or not value.strip():
+            continue
+        sampled += 1
+        match = _DATETIME_RE.match(_MACHINE_CODE_RE.sub(' ', value.strip()))
+        if match:
+            fmt = _DATETIME_FORMAT_BY_SHAPE[(match.group("sep"), match.group("seconds") is not None)]
+            counts[fmt] = counts.get(fmt, 0) + 1
+    return max(counts, key=counts.get) if counts else None
+
+
+def _compute_hours(check_in_ns: np.ndarray, check_out_ns: np.ndarray,
+                   break_minutes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批次計算實際工時與加班時數
+    
+    Args:
+        check_in_ns: 上班時間（epoch 奈秒，int64）
+        check_out_ns: 下班時間（epoch 奈秒，int64）
+        break_minutes: 休息分鐘數
+    
+    Returns:
+        (實際工時, 加班時數)，單位為小時
+    """
+    # 實際工時 = (下班時間 - 上班時間) - 休息分鐘
+    total_minutes = (check_out_ns - check_in_ns) / 1e9 / 60
+    actual_hours = (total_minutes - break_minutes) / 60
+    
+    # 加班時數 = 超過 8 小時的部分
+    overtime_hours = np.maximum(actual_hours - 8, 0)
+    
+    return actual_hours, overtime_hours
+
 
 class AttendanceRecord:
     """單筆打卡記錄"""
-    def __init__(self, name: str, emp_id: str, datetime_str: str, check_type: str):
+    __slots__ = ("name", "emp_id", "datetime_str", "check_type", "datetime")
+    
+    def __init__(self, name: str, emp_id: str, datetime_str: str, check_type: str,
+                 parsed_datetime: Optional[datetime] = None, default_format: Optional[str] = None):
         self.name = name
         self.emp_id = emp_id
         self.datetime_str = datetime_str
         self.check_type = check_type  # "簽到" or "簽退"
-        self.datetime = self._parse_datetime(datetime_str)
+        # 已整欄解析過時直接沿用，不再逐筆 strptime
+        if parsed_datetime is not None:
+            self.datetime = parsed_datetime
+        else:
+            self.datetime = self._parse_datetime(datetime_str, default_format)
     
-    def _parse_datetime(self, datetime_str: str) -> Optional[datetime]:
-        """解析各種日期時間格式"""
+    def _parse_datetime(self, datetime_str: str, default_format: Optional[str] = None) -> Optional[datetime]:
+        """
+        解析各種日期時間格式
+        
+        Args:
+            datetime_str: 原始日期時間字串
+            default_format: 同一檔案已判斷出的格式，優先嘗試；不符時再依序嘗試其他格式
+        """
         datetime_str = str(datetime_str).strip()
         
         # 移除機器代碼（例如 "A12P12"）
-        datetime_str = re.sub(r'\s+[A-Z0-9]+\s+', ' ', datetime_str)
+        datetime_str = _MACHINE_CODE_RE.sub(' ', datetime_str)
         
-        # 嘗試多種格式
-        formats = [
-            "%Y/%m/%d %H:%M",
-            "%Y-%m-%d %H:%M",
-            "%Y/%m/%d %H:%M:%S",
-            "%Y-%m-%d %H:%M:%S",
-            "%m/%d %H:%M",
-            "%m-%d %H:%M",
-        ]
+        if default_format:
+            try:
+                return datetime.strptime(datetime_str, default_format)
+            except ValueError:
+                pass
         
-        for fmt in formats:
+        # 最常見的固定寬度格式直接切片解析
+        parsed = _fast_parse_datetime(datetime_str)
+        if parsed is not None:
+            return parsed
+        
+        # 其他常見形態只需一次 strptime，避免逐一嘗試格式時反覆拋出 ValueError
+        match = _DATETIME_RE.match(datetime_str)
+        if match:
+            fmt = _DATETIME_FORMAT_BY_SHAPE[(match.group("sep"), match.group("seconds") is not None)]
+            try:
+                return datetime.strptime(datetime_str, fmt)
+            except ValueError:
+                return None
+        
+        # 嘗試多種格式
+        for fmt in _DATETIME_FORMATS:
             try:
                 return datetime.strptime(datetime_str, fmt)
             except ValueError:
@@ -46,12 +409,19 @@ class AttendanceRecord:
 
 class DailyAttendance:
     """單日出勤記錄"""
+    __slots__ = (
+        "name", "emp_id", "date", "records", "start_time_hour", "start_time_minute",
+        "check_in_time", "check_out_time", "break_start", "break_end",
+        "break_minutes", "actual_hours", "overtime_hours", "remarks",
+    )
+    
     def __init__(self, name: str, emp_id: str, date: datetime, records: List[AttendanceRecord],
-                 start_time_hour: int = 8, start_time_minute: int = 0):
+                 start_time_hour: int = 8, start_time_minute: int = 0, presorted: bool = False):
         self.name = name
         self.emp_id = emp_id
         self.date = date
-        self.records = sorted(records, key=lambda r: r.datetime if r.datetime else datetime.max)
+        # 呼叫端已依打卡時間排序時（presorted=True）不再重新排序
+        self.records = records if presorted else sorted(records, key=lambda r: r.datetime if r.datetime else datetime.max)
         self.start_time_hour = start_time_hour
         self.start_time_minute = start_time_minute
         
@@ -111,7 +481,7 @@ class DailyAttendance:
             # 2. 前一筆打卡時間落在 10:30–14:30
             if 30 <= interval_minutes <= 120:
                 r1_time = r1.datetime.time()
-                if datetime.strptime("10:30", "%H:%M").time() <= r1_time <= datetime.strptime("14:30", "%H:%M").time():
+                if _BREAK_WINDOW_START <= r1_time <= _BREAK_WINDOW_END:
                     self.break_start = r1.datetime
                     self.break_end = r2.datetime
                     self.break_minutes = int(interval_minutes)
@@ -149,45 +519,42 @@ class DailyAttendance:
             self.overtime_hours = 0
     
 
-    def _round_time_to_hour(self, dt: datetime, start_time_hour: int = 8, start_time_minute: int = 0) -> datetime:
-        """將時間無條件進位到整點（除非是遲到）"""
+    def _round_check_in_str(self, dt: datetime, start_time_hour: int = 8, start_time_minute: int = 0) -> str:
+        """將上班時間無條件進位到整點（除非是遲到），以當日分鐘數運算並直接回傳 "HH:00" 字串"""
         if not dt:
-            return dt
-        
-        # 起算時間
-        start_time = dt.replace(hour=start_time_hour, minute=start_time_minute, second=0, microsecond=0)
+            return ""
         
         # 如果已經超過起算時間（遲到），保持原時間但捨去分鐘
-        if dt >= start_time:
-            return dt.replace(minute=0, second=0, microsecond=0)
+        hour = dt.hour
         
-        # 如果還沒到起算時間，無條件進位到起算時間的整點
-        # 如果分鐘 > 0，進位到下一小時；否則保持原時間
-        if dt.minute > 0 or dt.second > 0:
-            return dt.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-        else:
-            return dt.replace(minute=0, second=0, microsecond=0)
-
-    def to_dict(self) -> Dict:
-        """轉換為字典格式"""
-        # 無條件進位上班時間到整點（除非是遲到）
-        check_in_rounded = self._round_time_to_hour(self.check_in_time, self.start_time_hour, self.start_time_minute) if self.check_in_time else None
+        # 如果還沒到起算時間且分鐘或秒數 > 0，進位到下一小時
+        if hour * 60 + dt.minute < start_time_hour * 60 + start_time_minute and (dt.minute or dt.second):
+            hour = (hour + 1) % 24
+        return f"{hour:02d}:00"
+    
+    def to_tuple(self) -> Tuple:
+        """轉換為依 RESULT_COLUMNS 排列的 tuple，批次建立 DataFrame 時使用"""
         # 下班時間保持原始打卡時間（不進位）
         check_out_rounded = self.check_out_time
         
-        return {
-            "日期": self.date.strftime("%Y/%m/%d") if self.date else "",
-            "姓名": self.name,
-            "考勤號碼": self.emp_id,
-            "上班時間": check_in_rounded.strftime("%H:%M") if check_in_rounded else "",
-            "下班時間": check_out_rounded.strftime("%H:%M") if check_out_rounded else "",
-            "休息開始": self.break_start.strftime("%H:%M") if self.break_start else "",
-            "休息結束": self.break_end.strftime("%H:%M") if self.break_end else "",
-            "休息分鐘數": self.break_minutes,
-            "實際工時": round(self.actual_hours, 2),
-            "加班時數": round(self.overtime_hours, 2),
-            "備註": self.remarks,
-        }
+        return (
+            self.date.strftime("%Y/%m/%d") if self.date else "",
+            self.name,
+            self.emp_id,
+            # 無條件進位上班時間到整點（除非是遲到）
+            self._round_check_in_str(self.check_in_time, self.start_time_hour, self.start_time_minute),
+            check_out_rounded.strftime("%H:%M") if check_out_rounded else "",
+            self.break_start.strftime("%H:%M") if self.break_start else "",
+            self.break_end.strftime("%H:%M") if self.break_end else "",
+            self.break_minutes,
+            round(self.actual_hours, 2),
+            round(self.overtime_hours, 2),
+            self.remarks,
+        )
+    
+    def to_dict(self) -> Dict:
+        """轉換為字典格式"""
+        return dict(zip(RESULT_COLUMNS, self.to_tuple()))
 
 
 class AttendanceProcessor:
@@ -203,20 +570,160 @@ class AttendanceProcessor:
         """
         self.employee_start_times = employee_start_times or {}
     
-    def _find_column(self, df: pd.DataFrame, keywords: List[str]) -> Optional[str]:
-        """根據關鍵字尋找欄位"""
-        for col in df.columns:
-            for keyword in keywords:
-                if keyword in col:
-                    return col
-        return None
+    def _parse_datetime_column(self, series: pd.Series) -> pd.Series:
+        """
+        整欄解析日期時間，無法解析者為 NaT
+        
+        只接受 _DATETIME_FORMATS 中含年份的固定格式（與逐筆 strptime 相同），
+        先試取樣判斷出的格式，僅對仍為 NaT 的列依序嘗試其餘格式
+        """
+        # 同一時間點常有多人打卡，只清理與解析不重複的字串，再依代碼展開回各列
+        codes, uniques = pd.factorize(series)
+        
+        # 移除機器代碼（例如 "A12P12"）
+        cleaned = pd.Series(uniques).astype(str).str.replace(_MACHINE_CODE_RE, ' ', regex=True).str.strip()
+        
+        # 同一檔案通常只有一種格式，先以取樣判斷出的固定格式解析；
+        # 不使用 format="mixed"，以免只有日期等殘缺字串被當成 00:00 打卡
+        # 缺少四位數年份（例如 "01/15 12:00"）無法歸屬到正確日期，與逐日處理時一樣略過，不進入解析
+        has_year = cleaned.str.match(r'\d{4}[-/]')
+        
+        sniffed = _sniff_datetime_format(cleaned)
+        formats = ((sniffed,) if sniffed else ()) + tuple(fmt for fmt in _DATED_DATETIME_FORMATS if fmt != sniffed)
+        parsed = pd.Series(pd.NaT, index=cleaned.index, dtype="datetime64[ns]")
+        for fmt in formats:
+            missing = parsed.isna() & has_year
+            if not missing.any():
+                break
+            parsed[missing] = pd.to_datetime(cleaned[missing], errors="coerce", format=fmt)
+        
+        # 空值的代碼為 -1，對應到 NaT
+        values = np.append(parsed.astype("datetime64[ns]").to_numpy(), np.datetime64("NaT", "ns"))
+        return pd.Series(values[codes], index=series.index)
+    
+    def _summarize_days(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        彙總每位員工每日的上下班、休息與工時
+        
+        規則與 DailyAttendance 相同，但整批以欄位運算完成，不建立逐筆物件
+        
+        Args:
+            df: 含已解析 _dt 欄位的打卡資料
+        
+        Returns:
+            每位員工每日一列的結果 DataFrame（日期欄為 datetime64，由呼叫端排序後再格式化）
+        """
+        keys = ["姓名", "考勤號碼", "_date"]
+        # 姓名或考勤號碼空白的打卡無法歸屬，直接略過
+        df = df.dropna(subset=["姓名", "考勤號碼"])
+        if df.empty:
+            return pd.DataFrame(columns=list(RESULT_COLUMNS))
+        df = df.assign(_date=df["_dt"].dt.normalize())
+        df = df.sort_values(keys + ["_dt"], kind="mergesort")
+        
+        # 排序後同一員工同一日的打卡相鄰，以鍵值改變處切分各組
+        # astype 超出 ns 範圍時會拋出錯誤，不會像 to_numpy(dtype=...) 靜默溢位
+        dt = df["_dt"].astype("datetime64[ns]").to_numpy()
+        new_group = np.zeros(len(dt), dtype=bool)
+        new_group[:1] = True
+        for col in keys:
+            values = df[col]
+            values = values.cat.codes.to_numpy() if isinstance(values.dtype, pd.CategoricalDtype) else values.to_numpy()
+            new_group[1:] |= values[1:] != values[:-1]
+        starts = np.flatnonzero(new_group)
+        ends = np.append(starts[1:], len(dt))
+        group_id = np.cumsum(new_group) - 1
+        
+        # 上班時間 = 當日最早的打卡時間，下班時間 = 當日最後一筆打卡
+        check_in = dt[starts]
+        check_out = dt[ends - 1]
+        
+        # 推估中間休息：相鄰打卡間隔 30–120 分鐘，且前一筆打卡落在 10:30–14:30
+        nat = np.datetime64("NaT", "ns")
+        prev_dt = np.concatenate(([nat], dt[:-1])) if len(dt) else dt
+        prev_dt[new_group] = nat
+        gap_minutes = (dt - prev_dt) / np.timedelta64(1, "s") / 60
+        prev_time = prev_dt - prev_dt.astype("datetime64[D]")
+        window_start = np.timedelta64(_BREAK_WINDOW_START.hour * 60 + _BREAK_WINDOW_START.minute, "m")
+        window_end = np.timedelta64(_BREAK_WINDOW_END.hour * 60 + _BREAK_WINDOW_END.minute, "m")
+        is_break = (
+            (gap_minutes >= 30) & (gap_minutes <= 120)
+            & (prev_time >= window_start) & (prev_time <= window_end)
+        )
+        
+        # 每組只取第一個符合的間隔
+        break_rows = np.flatnonzero(is_break)
+        break_groups = group_id[break_rows]
+        is_first = np.ones(len(break_rows), dtype=bool)
+        is_first[1:] = break_groups[1:] != break_groups[:-1]
+        break_rows = break_rows[is_first]
+        break_groups = break_groups[is_first]
+        
+        found = np.zeros(len(starts), dtype=bool)
+        found[break_groups] = True
+        break_start = np.full(len(starts), nat)
+        break_end = np.full(len(starts), nat)
+        break_minutes = np.zeros(len(starts), dtype=np.int64)
+        break_start[break_groups] = prev_dt[break_rows]
+        break_end[break_groups] = dt[break_rows]
+        # 若推估出的休息分鐘數 < 60 分鐘，一律以 60 分鐘計
+        break_minutes[break_groups] = np.maximum(gap_minutes[break_rows].astype(np.int64), 60)
+        
+        # 如果沒有找到休息記錄，則推估：工作 4 小時後休息 1 小時
+        fallback_start = check_in + np.timedelta64(4, "h")
+        use_fallback = ~found & (fallback_start < check_out)
+        break_start[use_fallback] = fallback_start[use_fallback]
+        break_end[use_fallback] = fallback_start[use_fallback] + np.timedelta64(1, "h")
+        break_minutes[use_fallback] = 60
+        
+        # 計算實際工時與加班時數
+        actual_hours, overtime_hours = _compute_hours(
+            check_in.view("int64"), check_out.view("int64"), break_minutes
+        )
+        
+        # 無條件進位上班時間到整點（除非是遲到）
+        dates = df["_date"].astype("datetime64[ns]").to_numpy()[starts]
+        emp_ids = df["考勤號碼"].array[starts]
+        start_minutes = {
+            emp_id: hour * 60 + minute
+            for emp_id, (hour, minute) in self.employee_start_times.items()
+        }
+        emp_start = pd.Series(emp_ids).astype(str).map(start_minutes).fillna(8 * 60).to_numpy(dtype=np.int64)
+        start_time = dates + emp_start * np.timedelta64(1, "m")
+        hour_floor = check_in.astype("datetime64[h]").astype("datetime64[ns]")
+        has_minutes = (check_in - hour_floor) >= np.timedelta64(1, "s")
+        check_in_rounded = np.where((check_in < start_time) & has_minutes, hour_floor + np.timedelta64(1, "h"), hour_floor)
+        
+        def hhmm(values: np.ndarray) -> np.ndarray:
+            # "YYYY-MM-DDTHH:MM" 取第 11–15 字元，NaT 輸出空字串
+            chars = np.datetime_as_string(values, unit="m").astype("U16").view("U1").reshape(-1, 16)
+            out = np.ascontiguousarray(chars[:, 11:16]).view("U5").ravel()
+            out[np.isnat(values)] = ""
+            return out
+        
+        result_df = pd.DataFrame({
+            "日期": dates,
+            "姓名": df["姓名"].array[starts],
+            "考勤號碼": emp_ids,
+            "上班時間": hhmm(check_in_rounded),
+            "下班時間": hhmm(check_out),
+            "休息開始": hhmm(break_start),
+            "休息結束": hhmm(break_end),
+            "休息分鐘數": break_minutes,
+            # 以 Python round() 進位，與 DailyAttendance 一致（np.round 對剛好半位的值結果不同）
+            "實際工時": [round(hours, 2) for hours in actual_hours.tolist()],
+            "加班時數": [round(hours, 2) for hours in overtime_hours.tolist()],
+            "備註": "",
+        }, columns=list(RESULT_COLUMNS))
+        
+        return result_df
     
-    def process_csv(self, csv_content: str) -> pd.DataFrame:
+    def process_csv(self, csv_content: Union[str, pd.DataFrame]) -> pd.DataFrame:
         """
         處理 CSV 內容
         
         Args:
-            csv_content: CSV 文字內容或檔案路徑
+            csv_content: CSV 文字內容、檔案路徑，或已讀入的 DataFrame / pyarrow Table
         
         Returns:
             處理後的 DataFrame
@@ -224,128 +731,61 @@ class AttendanceProcessor:
         try:
             # 嘗試讀取 CSV
             import os
-            if isinstance(csv_content, str) and (csv_content.startswith("/") or os.path.exists(csv_content)):
-                # 嘗試多種編碼
-                encodings = ['utf-8', 'big5', 'gb2312', 'latin-1', 'cp1252']
+            if isinstance(csv_content, pd.DataFrame):
+                df = csv_content.copy()
+            elif hasattr(csv_content, "to_pandas"):
+                df = csv_content.to_pandas()
+            elif isinstance(csv_content, str) and (csv_content.startswith("/") or os.path.exists(csv_content)):
+                with open(csv_content, "rb") as f:
+                    raw = f.read()
+                
+                # 先偵測編碼只解析一次；偵測失敗時才逐一嘗試多種編碼
                 df = None
-                for encoding in encodings:
+                detected = detect_csv_encoding(raw)
+                if detected:
                     try:
-                        df = pd.read_csv(csv_content, encoding=encoding)
-                        break
+                        df = read_csv_bytes(raw, detected)
                     except (UnicodeDecodeError, LookupError):
-                        continue
+                        df = None
+                if df is None:
+                    encodings = ['utf-8', 'big5', 'gb2312', 'latin-1', 'cp1252']
+                    for encoding in encodings:
+                        try:
+                            df = read_csv_bytes(raw, encoding)
+                            break
+                        except (UnicodeDecodeError, LookupError):
+                            continue
                 if df is None:
                     raise ValueError("無法以任何編碼讀取 CSV 檔案")
             else:
-                from io import StringIO
-                df = pd.read_csv(StringIO(csv_content))
+                df = read_csv_bytes(csv_content.encode("utf-8"), "utf-8")
         except Exception as e:
             raise ValueError(f"無法讀取 CSV：{str(e)}")
         
         # 標準化欄位名稱
-        df.columns = df.columns.str.strip()
-        
-        # 建立欄位映射字典
-        column_mapping = {}
-        
-        # 尋找姓名欄位
-        name_col = self._find_column(df, ["姓名", "名字", "name"])
-        if not name_col:
-            raise ValueError("缺少姓名欄位")
-        column_mapping[name_col] = "姓名"
-        
-        # 尋找考勤號碼欄位
-        emp_id_col = self._find_column(df, ["考勤", "號碼", "id", "員工", "工號"])
-        if not emp_id_col:
-            raise ValueError("缺少考勤號碼欄位")
-        column_mapping[emp_id_col] = "考勤號碼"
-        
-        # 尋找日期時間欄位
-        datetime_col = self._find_column(df, ["日期時間", "時間", "datetime", "date"])
-        if not datetime_col:
-            raise ValueError("缺少日期時間欄位")
-        column_mapping[datetime_col] = "日期時間"
-        
-        # 尋找簽到/簽退欄位
-        check_col = self._find_column(df, ["簽", "check", "status"])
-        if not check_col:
-            raise ValueError("缺少簽到/退欄位")
-        column_mapping[check_col] = "簽到/退"
-        
-        # 應用欄位映射
-        df.rename(columns=column_mapping, inplace=True)
-        
-        # 分組處理
-        results = []
-        grouped = df.groupby(["姓名", "考勤號碼"])
-        
-        for (name, emp_id), group in grouped:
-            # 提取日期（從日期時間欄位）
-            group["日期"] = group["日期時間"].str.extract(r'(\d+/\d+/\d+)')[0]
-            
-            for date_str, date_group in group.groupby("日期"):
-                if pd.isna(date_str):
-                    continue
-                
-                # 解析日期
-                try:
-                    date = datetime.strptime(date_str, "%Y/%m/%d").date()
-                except ValueError:
-                    continue
-                
-                # 建立打卡記錄
-                records = []
-                for _, row in date_group.iterrows():
-                    record = AttendanceRecord(
-                        name=name,
-                        emp_id=emp_id,
-                        datetime_str=row["日期時間"],
-                        check_type=row.get("簽到/退", "")
-                    )
-                    if record.datetime:
-                        records.append(record)
-                
-                if not records:
-                    continue
-                
-                # 建立日出勤記錄
-                start_hour, start_minute = self.employee_start_times.get(
-                    str(emp_id), (8, 0)
-                )
-                
-                daily = DailyAttendance(
-                    name=name,
-                    emp_id=emp_id,
-                    date=datetime.combine(date, datetime.min.time()),
-                    records=records,
-                    start_time_hour=start_hour,
-                    start_time_minute=start_minute
-                )
-                
-                results.append(daily.to_dict())
+        df = standardize_columns(df)
         
-        # 轉換為 DataFrame
-        if not results:
-            raise ValueError("沒有可處理的記錄")
+        # 分組鍵轉為類別型別，排序與切分改以整數代碼運算
+        for col in ("姓名", "考勤號碼"):
+            df[col] = df[col].astype("category")
         
-        result_df = pd.DataFrame(results)
+        # 整欄一次解析日期時間，捨棄無法解析的列
+        df["_dt"] = self._parse_datetime_column(df["日期時間"])
+        df = df.dropna(subset=["_dt"])
         
-        # 轉換日期為 datetime 以便正確排序
-        result_df["日期"] = pd.to_datetime(result_df["日期"], format="%Y/%m/%d")
+        # 以欄位運算彙總每位員工每日的出勤
+        result_df = self._summarize_days(df)
+        if result_df.empty:
+            raise ValueError("沒有可處理的記錄")
         
-        # 按日期和姓名排序
+        # 日期欄仍為 datetime64，直接按日期和姓名排序，最後才轉為字串格式
         result_df = result_df.sort_values(["日期", "姓名"], ascending=[True, True]).reset_index(drop=True)
+        date_chars = np.datetime_as_string(result_df["日期"].to_numpy(dtype="datetime64[ns]"), unit="D")
+        date_chars = date_chars.astype("U10").view("U1").reshape(-1, 10)
+        date_chars[:, [4, 7]] = "/"
+        result_df["日期"] = date_chars.view("U10").ravel()
         
-        # 轉換日期回字串格式
-        result_df["日期"] = result_df["日期"].dt.strftime("%Y/%m/%d")
-        
-        # 確保欄位順序
-        column_order = [
-            "日期", "姓名", "考勤號碼", "上班時間", "下班時間",
-            "休息開始", "休息結束", "休息分鐘數", "實際工時", "加班時數", "備註"
-        ]
-        
-        return result_df[column_order]
+        return result_df
     
     def export_to_excel(self, df: pd.DataFrame, output_path: str):
         """
@@ -355,19 +795,4 @@ class AttendanceProcessor:
             df: 結果 DataFrame
             output_path: 輸出檔案路徑
         """
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-            df.to_excel(writer, sheet_name="出勤記錄", index=False)
-            
-            # 調整欄寬
-            worksheet = writer.sheets["出勤記錄"]
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
+        write_excel(df, output_path)
@@ -182,5 +182,79 @@ def test_calculator():
         traceback.print_exc()
 
 
+def test_batch_matches_daily_attendance():
+    """整批計算結果應與逐日 DailyAttendance 完全相同（含秒數的打卡時間）"""
+    import random
+    from attendance_calculator import AttendanceProcessor, AttendanceRecord, DailyAttendance
+    
+    rng = random.Random(20240115)
+    start_times = {"E02": (9, 30)}
+    
+    # 隨機產生含秒數的打卡：上班、午休前後、下班，部分日子沒有午休打卡
+    lines = ["姓名,考勤號碼,日期時間,簽到/退"]
+    days = {}
+    for emp_idx in range(20):
+        name, emp_id = f"員工{emp_idx:02d}", f"E{emp_idx:02d}"
+        for day in range(30):
+            base = datetime(2024, 3, 1) + timedelta(days=day)
+            check_in = base + timedelta(seconds=rng.randrange(7 * 3600, 10 * 3600))
+            punches = [(check_in, "簽到")]
+            if rng.random() < 0.8:
+                lunch = base + timedelta(seconds=rng.randrange(11 * 3600, 13 * 3600))
+                punches.append((lunch, "簽退"))
+                punches.append((lunch + timedelta(seconds=rng.randrange(20 * 60, 130 * 60)), "簽到"))
+            punches.append((base + timedelta(seconds=rng.randrange(16 * 3600, 21 * 3600)), "簽退"))
+            
+            records = []
+            for dt, check_type in punches:
+                dt_str = dt.strftime("%Y/%m/%d %H:%M:%S")
+                lines.append(f"{name},{emp_id},{dt_str},{check_type}")
+                records.append(AttendanceRecord(name, emp_id, dt_str, check_type))
+            days[(base, name)] = DailyAttendance(name, emp_id, base, records, *start_times.get(emp_id, (8, 0)))
+    
+    result_df = AttendanceProcessor(employee_start_times=start_times).process_csv("\n".join(lines))
+    
+    expected = [days[key].to_tuple() for key in sorted(days)]
+    actual = [tuple(row) for row in result_df.astype({"考勤號碼": str}).itertuples(index=False, name=None)]
+    assert len(actual) == len(expected)
+    for exp_row, act_row in zip(expected, actual):
+        assert exp_row == act_row, f"{exp_row} != {act_row}"
+
+
+def test_malformed_datetime_cells_are_skipped():
+    """只有日期、缺少年份的打卡應被略過，不可變成 00:00 或錯誤年份的打卡"""
+    from io import StringIO
+    import pandas as pd
+    from attendance_calculator import AttendanceProcessor
+    
+    valid = [
+        "王小明,001,2024/01/15 08:30,簽到",
+        "王小明,001,2024/01/15 17:30,簽退",
+        # 以 - 分隔的日期
+        "李小華,002,2024-01-16 08:15,簽到",
+        "李小華,002,2024-01-16 12:30,簽退",
+        "李小華,002,2024-01-16 13:30,簽到",
+        "李小華,002,2024-01-16 18:00,簽退",
+    ]
+    malformed = [
+        "王小明,001,2024/01/15,簽到",
+        "李小華,002,2024-01-16,簽到",
+        "李小華,002,01/16 07:30,簽到",
+    ]
+    header = "姓名,考勤號碼,日期時間,簽到/退"
+    csv_content = "\n".join([header] + malformed + valid)
+    expected = AttendanceProcessor().process_csv("\n".join([header] + valid))
+    
+    for source in (csv_content, pd.read_csv(StringIO(csv_content))):
+        result_df = AttendanceProcessor().process_csv(source)
+        pd.testing.assert_frame_equal(result_df, expected)
+    
+    rows = {row["姓名"]: row for _, row in expected.iterrows()}
+    assert (rows["王小明"]["日期"], rows["王小明"]["上班時間"], rows["王小明"]["實際工時"]) == ("2024/01/15", "08:00", 8.0)
+    assert (rows["李小華"]["日期"], rows["李小華"]["上班時間"], rows["李小華"]["實際工時"]) == ("2024/01/16", "08:00", 8.75)
+
+
 if __name__ == "__main__":
     test_calculator()
+    test_batch_matches_daily_attendance()
+    test_malformed_datetime_cells_are_skipped()